@@ -81,6 +81,10 @@ class Entries(Manager):
         except KeyError:
             return self.create(**fields)
 
+    def update_or_create_many(self, feed_obj, fields_list):
+        return [self.update_or_create(feed_obj, **fields)
+                    for fields in fields_list]
+
     def _verify_post_consistency(self, pk, post, clean=True):
         is_string = lambda s: isinstance(s, basestring)
         is_datetime = lambda s: isinstance(s, datetime)
@@ -13,6 +13,7 @@ DEFAULT_NUM_POSTS = -1
 DEFAULT_CACHE_MIN = 30
 DEFAULT_ENTRY_WORD_LIMIT = 100
 DEFAULT_FEED_TIMEOUT = 10
+DEFAULT_REFRESH_WORKERS = 8
 DEFAULT_REFRESH_EVERY = 3 * 60 * 60             # 3 hours
 DEFAULT_FEED_LOCK_EXPIRE = 60 * 3               # lock expires in 3 minutes.
 DEFAULT_MIN_REFRESH_INTERVAL = timedelta(seconds=60 * 20)
@@ -58,6 +59,30 @@ MIN_REFRESH_INTERVAL = getattr(settings, "DJANGOFEEDS_MIN_REFRESH_INTERVAL",
 FEED_TIMEOUT = getattr(settings, "DJANGOFEEDS_FEED_TIMEOUT",
                        DEFAULT_FEED_TIMEOUT)
 
+""" .. data:: REFRESH_WORKERS
+
+    Number of threads used to refresh feeds concurrently when
+    refreshing all feeds at once.
+    Default: 8, or 1 if the default database is SQLite, as SQLite
+    can't write from several connections at once ("database is locked").
+    Taken from: ``settings.DJANGOFEEDS_REFRESH_WORKERS``.
+
+"""
+_DEFAULT_DB_ENGINE = settings.DATABASES.get("default", {}).get("ENGINE", "")
+REFRESH_WORKERS = getattr(settings, "DJANGOFEEDS_REFRESH_WORKERS",
+                          1 if "sqlite" in _DEFAULT_DB_ENGINE
+                            else DEFAULT_REFRESH_WORKERS)
+
+""" .. data:: MAX_FEED_BYTES
+
+    Refuse to download feeds with a ``Content-Length`` larger than this
+    (in bytes). :const:`None` means no limit.
+    Default: :const:`None`
+    Taken from: ``settings.DJANGOFEEDS_MAX_FEED_BYTES``.
+
+"""
+MAX_FEED_BYTES = getattr(settings, "DJANGOFEEDS_MAX_FEED_BYTES", None)
+
 
 def _interval(interval):
     if isinstance(interval, int):
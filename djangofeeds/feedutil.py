@@ -5,9 +5,12 @@ import re
 import pytz
 
 from base64 import b64encode
-from datetime import datetime, timedelta
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
 
 from django.utils.text import truncate_html_words
+from django.utils.encoding import force_unicode
 from django.utils.hashcompat import md5_constructor
 
 from djangofeeds import conf
@@ -17,6 +20,22 @@ feed_content_optimizer = PostContentOptimizer()
 
 GUID_FIELDS = frozenset(("title", "link", "author"))
 
+# Sort key for entries, see entries_by_date.
+_updated_parsed = itemgetter("updated_parsed")
+
+# Bound as default arguments of the per-entry date functions below,
+# so they are fast local lookups there.
+_mktime = time.mktime
+_fromtimestamp = datetime.fromtimestamp
+_now = datetime.now
+
+DATETIME_CACHE_MAX = 4096
+_datetime_cache = {}
+
+# Matches everything Django's truncate_html_words counts as a word, and
+# then some (words inside tags and entities).
+_words = re.compile(r"\w[\w-]*", re.U)
+
 
 def format_date(t):
     """Make sure time object is a :class:`datetime.datetime` object."""
@@ -116,31 +135,48 @@ def entries_by_date(entries, limit=None):
     :param limit: Limit number of posts.
 
     """
-    now = datetime.now(pytz.utc)
-
-    def find_date(entry, counter):
-        """Find the most current date entry tuple."""
+    now = time.time()
 
-        return (entry.get("updated_parsed") or
-                entry.get("published_parsed") or
-                entry.get("date_parsed") or
-                now - timedelta(seconds=(counter * 30)))
-
-    sorted_entries = []
     for counter, entry in enumerate(entries):
-        date = format_date(find_date(entry, counter))
+        date = (entry.get("updated_parsed") or
+                entry.get("published_parsed") or
+                entry.get("date_parsed"))
+        if date:
+            # Parsed dates are already time tuples, which sort in date
+            # order as they are.
+            if not isinstance(date, time.struct_time):
+                date = format_date(date).timetuple()
+        else:
+            # Undated entries are spaced 30 seconds apart, in feed order.
+            date = time.gmtime(now - counter * 30)
         # the found date is put into the entry
         # because some feed just don't have any valid dates.
         # This will ensure that the posts will be properly ordered
         # later on when put into the database.
-        entry["updated_parsed"] = date.timetuple()
-        entry["published_parsed"] = entry.get("published_parsed") or \
-                                        date.timetuple()
-        sorted_entries.append((date, entry))
+        entry["updated_parsed"] = date
+        entry["published_parsed"] = entry.get("published_parsed") or date
+
+    # Sorting on the date alone means entries are never compared, and
+    # lets the sort detect that most feeds are already newest first,
+    # which it then handles in linear time. The sort is stable, so
+    # entries with the same date keep their original order.
+    sorted_entries = sorted(entries, key=_updated_parsed, reverse=True)
+    return sorted_entries[:limit]
 
-    sorted_entries.sort(key=lambda key: key[0])
-    sorted_entries.reverse()
-    return [entry for _date, entry in sorted_entries[:limit]]
+
+def truncate_words_fast(html, num):
+    """Same as :func:`django.utils.text.truncate_html_words`, but
+    returns early if the text can't have more than ``num`` words.
+
+    Counting the words with a single regex pass over the text, markup
+    included, is much cheaper than the HTML aware truncation, and most
+    posts are short enough to never need it.
+
+    """
+    html = force_unicode(html)
+    if len(list(islice(_words.finditer(html), num + 1))) <= num:
+        return html
+    return truncate_html_words(html, num)
 
 
 def find_post_content(feed_obj, entry):
@@ -171,30 +207,49 @@ def find_post_content(feed_obj, entry):
             img = ""
         content = img + content
     try:
-        content = truncate_html_words(content, conf.DEFAULT_ENTRY_WORD_LIMIT)
+        content = truncate_words_fast(content, conf.DEFAULT_ENTRY_WORD_LIMIT)
     except UnicodeDecodeError:
         content = ""
 
     return feed_content_optimizer.optimize(content)
 
 
+def _tuple_to_datetime(t, _cache=_datetime_cache,
+        _mktime=_mktime, _fromtimestamp=_fromtimestamp):
+    """Convert a :mod:`feedparser` date tuple to a
+    :class:`datetime.datetime`, memoized as feeds often repeat dates."""
+    if not isinstance(t, tuple):
+        t = tuple(t)
+    try:
+        return _cache[t]
+    except KeyError:
+        if len(_cache) >= DATETIME_CACHE_MAX:
+            _cache.clear()
+        date = _fromtimestamp(_mktime(t)).replace(tzinfo=utc)
+        _cache[t] = date
+        return date
+
+
 def date_to_datetime(field_name):
     """Given a post field, convert its :mod:`feedparser` date tuple to
     :class:`datetime.datetime` objects.
 
     :param field_name: The post field to use.
 
+    The returned handler falls back to the current time if the field is
+    missing or invalid. Pass ``now`` to use that time instead, so all the
+    entries of a refresh share the same fallback date.
+
     """
 
-    def _field_to_datetime(feed_obj, entry):
+    def _field_to_datetime(feed_obj, entry, now=None,
+            _to_datetime=_tuple_to_datetime, _now=_now):
         if field_name in entry:
             try:
-                time_ = time.mktime(entry[field_name])
-                date = datetime.fromtimestamp(time_).replace(tzinfo=utc)
+                return _to_datetime(entry[field_name])
             except TypeError:
-                date = datetime.now(pytz.utc)
-            return date
-        return datetime.now(pytz.utc)
+                pass
+        return now or _now(pytz.utc)
     _field_to_datetime.__doc__ = "Convert %s to datetime" % repr(field_name)
 
     return _field_to_datetime
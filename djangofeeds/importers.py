@@ -3,17 +3,51 @@ import socket
 import feedparser
 import httplib as http
 import urllib2
+import urlparse
 
+from calendar import timegm
 from datetime import datetime
+from email.utils import formatdate
 
 from djangofeeds import conf
 from djangofeeds import models
 from djangofeeds import feedutil
+from djangofeeds import parsers
 from djangofeeds import exceptions
 from djangofeeds.utils import get_default_logger, truncate_field_data
 from djangofeeds.backends import backend_or_default
 from django.utils.timezone import utc
 
+_REDIRECT_STATUSES = frozenset([http.FOUND, http.MOVED_PERMANENTLY])
+
+_date_published = feedutil.date_to_datetime("published_parsed")
+_date_updated = feedutil.date_to_datetime("updated_parsed")
+
+_field_parsers = {}
+
+
+def compile_post_field_handlers(fields):
+    """Generate a function calling the post field handlers for ``fields``.
+
+    The function takes the handlers, the feed object and the entry, and
+    returns the parsed fields, like looping over the handlers would, but
+    with the field names as constants in a single dict display.
+    Functions are generated once for each set of fields.
+
+    """
+    fields = tuple(fields)
+    try:
+        return _field_parsers[fields]
+    except KeyError:
+        source = "def parse_fields(handlers, feed_obj, entry):\n" \
+                 "    return {%s}\n" % ", ".join(
+                    "%r: handlers[%r](feed_obj, entry)" % (field, field)
+                        for field in fields)
+        namespace = {}
+        exec compile(source, "<post_field_handlers>", "exec") in namespace
+        parse_fields = _field_parsers[fields] = namespace["parse_fields"]
+        return parse_fields
+
 
 class FeedImporter(object):
     """Import/Update feeds.
@@ -51,10 +85,14 @@ class FeedImporter(object):
 
     .. attribute:: parser
 
-        The feed parser used. (Default: :mod:`feedparser`.)
+        The feed parser used. (Default:
+        :class:`djangofeeds.parsers.SessionFeedParser`, which is
+        :mod:`feedparser` reusing HTTP connections between feeds.)
+        See :class:`djangofeeds.parsers.LxmlFeedParser` for a faster
+        alternative.
 
     """
-    parser = feedparser
+    parser = parsers.SessionFeedParser()
     post_limit = conf.DEFAULT_POST_LIMIT
     include_categories = conf.STORE_CATEGORIES
     include_enclosures = conf.STORE_ENCLOSURES
@@ -65,8 +103,8 @@ class FeedImporter(object):
     enclosure_model = models.Enclosure
     post_field_handlers = {
         "content": feedutil.find_post_content,
-        "date_published": feedutil.date_to_datetime("published_parsed"),
-        "date_updated": feedutil.date_to_datetime("updated_parsed"),
+        "date_published": _date_published,
+        "date_updated": _date_updated,
         "link": lambda feed_obj, entry: entry.get("link") or feed_obj.feed_url,
         "feed": lambda feed_obj, entry: feed_obj,
         "guid": feedutil.get_entry_guid,
@@ -74,6 +112,8 @@ class FeedImporter(object):
                                                     "(no title)").strip(),
         "author": lambda feed_obj, entry: entry.get("author", "").strip(),
     }
+    # Copy of the original handlers, to tell if they have been changed.
+    _default_post_field_handlers = dict(post_field_handlers)
 
     def __init__(self, **kwargs):
         self.post_limit = kwargs.get("post_limit", self.post_limit)
@@ -87,6 +127,7 @@ class FeedImporter(object):
         self.timeout = kwargs.get("timeout", conf.FEED_TIMEOUT)
         self.backend = backend_or_default(kwargs.get("backend"))
         self.post_model = self.backend.get_post_model()
+        self._category_cache = {}
 
     def parse_feed(self, feed_url, etag=None, modified=None, timeout=None,
             maxlen=None):
@@ -98,36 +139,86 @@ class FeedImporter(object):
         :keyword modified: ``Last-Modified`` HTTP header received from last
             parse (if any).
         :keyword timeout: Parser timeout in seconds.
+        :keyword maxlen: Refuse feeds with a ``Content-Length`` larger
+            than this. (Default: :data:`djangofeeds.conf.MAX_FEED_BYTES`.)
+
+        If ``maxlen`` is set and the feed is fetched over HTTP, a
+        ``HEAD`` request is made first to check the size of the feed.
+        It is conditional if the ``etag`` or ``modified`` of a previous
+        fetch is known, so unchanged feeds are not downloaded at all.
+
+        The parsers in :mod:`djangofeeds.parsers` set the timeout on
+        their own connections. For other parsers the socket default
+        timeout is changed while parsing, which is process global.
 
         """
-        prev_timeout = socket.getdefaulttimeout()
         timeout = timeout or self.timeout
+        maxlen = maxlen or conf.MAX_FEED_BYTES
+        is_http = urlparse.urlparse(feed_url).scheme in ("http", "https")
+        if is_http and maxlen:
+            try:
+                headers = self.early_headers(feed_url,
+                                             etag=etag,
+                                             modified=modified,
+                                             timeout=timeout)
+            except urllib2.HTTPError:
+                # Some servers don't support HEAD requests, the size
+                # is unknown then, same as without Content-Length.
+                headers = {}
+            if headers is None:
+                return feedparser.FeedParserDict(
+                        status=http.NOT_MODIFIED, entries=[])
+            contentlen = int(headers.get("content-length") or 0)
+            if maxlen and contentlen > maxlen:
+                raise exceptions.FeedCriticalError(
+                    unicode(models.FEED_GENERIC_ERROR_TEXT))
+
+        if isinstance(self.parser, parsers.FeedFetcher):
+            return self.parser.parse(feed_url,
+                                     etag=etag,
+                                     modified=modified,
+                                     timeout=timeout)
 
-        socket.setdefaulttimeout(timeout)
+        # Only touch the process global timeout if needed, so concurrent
+        # refreshes sharing the same timeout don't race each other.
+        prev_timeout = socket.getdefaulttimeout()
+        if timeout != prev_timeout:
+            socket.setdefaulttimeout(timeout)
         try:
-            if maxlen:
-                headers = self.early_headers(feed_url)
-                contentlen = int(headers.get("content-length") or 0)
-                if contentlen > maxlen:
-                    raise exceptions.FeedCriticalError(
-                        unicode(models.FEED_GENERIC_ERROR_TEXT))
-
-            feed = self.parser.parse(feed_url,
+            return self.parser.parse(feed_url,
                                      etag=etag,
                                      modified=modified)
         finally:
-            socket.setdefaulttimeout(prev_timeout)
+            if timeout != prev_timeout:
+                socket.setdefaulttimeout(prev_timeout)
+
+    def early_headers(self, feed_url, etag=None, modified=None,
+            timeout=None):
+        """Get the headers of a feed without downloading it.
 
-        return feed
+        Returns :const:`None` if ``etag`` or ``modified`` is given and
+        the server says the feed has not been modified since.
 
-    def early_headers(self, feed_url):
+        """
 
         class HeadRequest(urllib2.Request):
 
             def get_method(self):
                 return "HEAD"
 
-        return urllib2.urlopen(HeadRequest(feed_url)).headers
+        request = HeadRequest(feed_url)
+        if etag:
+            request.add_header("If-None-Match", etag)
+        if modified:
+            request.add_header("If-Modified-Since",
+                               formatdate(timegm(modified), usegmt=True))
+        try:
+            return urllib2.urlopen(request, timeout=timeout or
+                                   socket.getdefaulttimeout()).headers
+        except urllib2.HTTPError, exc:
+            if exc.code == http.NOT_MODIFIED:
+                return None
+            raise
 
     def real_headers(self, feed_url):
         return urllib2.urlopen(urllib2.Request(feed_url))
@@ -167,10 +258,7 @@ class FeedImporter(object):
                         unicode(models.FEED_GENERIC_ERROR_TEXT),
                         status=status)
 
-            # Feed can be local/fetched with a HTTP client.
-            status = feed.get("status") or feed.get("status\n") or http.OK
-
-            if status == http.FOUND or status == http.MOVED_PERMANENTLY:
+            if status in _REDIRECT_STATUSES:
                 if feed_url != feed.href:
                     return self.import_feed(feed.href, force=force)
 
@@ -180,8 +268,10 @@ class FeedImporter(object):
                             "name": feed_name,
                             "description": feed.channel.get("description", ""),
             })
-            feed_obj = self.feed_model.objects.update_or_create(
-                                            feed_url=feed_url, **feed_data)
+            # The feed was not found above, so there is nothing to
+            # update if it has been created meanwhile.
+            feed_obj = self.feed_model.objects.get_or_create(
+                                feed_url=feed_url, defaults=feed_data)[0]
 
         if self.include_categories:
             feed_obj.categories.add(*self.get_categories(feed.channel))
@@ -199,13 +289,20 @@ class FeedImporter(object):
     def create_category(self, domain, name):
         """Create new category.
 
+        Categories are cached by the importer, so the database is only
+        queried the first time a category is seen.
+
         :param domain: The category domain.
         :param name: The name of the category.
 
         """
-        return self.category_model.objects.update_or_create(
-                      name=name.strip(),
-                      domain=domain and domain.strip() or "")
+        key = (domain and domain.strip() or "", name.strip())
+        category = self._category_cache.get(key)
+        if category is None:
+            category = self._category_cache[key] = \
+                self.category_model.objects.get_or_create(domain=key[0],
+                                                          name=key[1])[0]
+        return category
 
     def update_feed(self, feed_obj, feed=None, force=False):
         """Update (refresh) feed.
@@ -257,11 +354,12 @@ class FeedImporter(object):
 
         if feed.entries:
             sorted_by_date = feedutil.entries_by_date(feed.entries, limit)
-            for entry in sorted_by_date:
-                self.import_entry(entry, feed_obj)
+            self.import_entries(sorted_by_date, feed_obj, now=now)
 
         feed_obj.date_last_refresh = now
         feed_obj.http_etag = feed.get("etag", "")
+        feed_obj.last_error = u""
+        feed_obj.date_changed = now
         if hasattr(feed, "modified") and feed.modified:
             try:
                 as_ts = time.mktime(feed.modified)
@@ -273,7 +371,14 @@ class FeedImporter(object):
         self.logger.debug("uf: %s Saving feed object..." % (
                             feed_obj.feed_url))
 
-        feed_obj.save()
+        # Only write the fields changed by the refresh, instead of
+        # saving every column of the feed.
+        self.feed_model.objects.filter(pk=feed_obj.pk).update(
+                date_last_refresh=feed_obj.date_last_refresh,
+                http_etag=feed_obj.http_etag,
+                http_last_modified=feed_obj.http_last_modified,
+                last_error=feed_obj.last_error,
+                date_changed=feed_obj.date_changed)
         return feed_obj
 
     def create_enclosure(self, **kwargs):
@@ -289,16 +394,38 @@ class FeedImporter(object):
                     for enclosure in getattr(entry, "enclosures", [])
                         if enclosure and hasattr(enclosure, "length")]
 
-    def post_fields_parsed(self, entry, feed_obj):
-        """Parse post fields."""
-        return dict((key, handler(feed_obj, entry))
-                        for key, handler in self.post_field_handlers.items())
+    def post_fields_parsed(self, entry, feed_obj, now=None):
+        """Parse post fields.
+
+        Uses :attr:`post_field_handlers` if it has been changed, otherwise
+        the fields are parsed directly. See
+        :func:`compile_post_field_handlers`.
 
-    def import_entry(self, entry, feed_obj):
+        :keyword now: Date used for posts without a valid date.
+            (Default: the current time.)
+
+        """
+        handlers = self.post_field_handlers
+        if handlers != self._default_post_field_handlers:
+            return compile_post_field_handlers(handlers)(handlers,
+                                                         feed_obj, entry)
+        get = entry.get
+        return {
+            "content": feedutil.find_post_content(feed_obj, entry),
+            "date_published": _date_published(feed_obj, entry, now),
+            "date_updated": _date_updated(feed_obj, entry, now),
+            "link": get("link") or feed_obj.feed_url,
+            "feed": feed_obj,
+            "guid": feedutil.get_entry_guid(feed_obj, entry),
+            "title": get("title", "(no title)").strip(),
+            "author": get("author", "").strip(),
+        }
+
+    def import_entry(self, entry, feed_obj, now=None):
         """Import feed post entry."""
         self.logger.debug("ie: %s Importing entry..." % feed_obj.feed_url)
 
-        fields = self.post_fields_parsed(entry, feed_obj)
+        fields = self.post_fields_parsed(entry, feed_obj, now=now)
         post = self.post_model.objects.update_or_create(feed_obj, **fields)
 
         if self.include_enclosures:
@@ -310,3 +437,45 @@ class FeedImporter(object):
             feed_obj.feed_url))
 
         return post
+
+    def import_entries(self, entries, feed_obj, now=None):
+        """Import several feed post entries at once.
+
+        Same as calling :meth:`import_entry` for every entry, but
+        the posts and their relations are stored using as few database
+        queries as possible. If :meth:`import_entry` has been overridden,
+        or the post storage backend can't store many posts at once,
+        :meth:`import_entry` is called for every entry instead.
+
+        :keyword now: Date used for posts without a valid date.
+            (Default: the current time.)
+
+        """
+        if self.import_entry.im_func is not FeedImporter.import_entry.im_func:
+            return [self.import_entry(entry, feed_obj) for entry in entries]
+        manager = self.post_model.objects
+        if not (hasattr(manager, "update_or_create_many") and
+                hasattr(manager, "add_related_many")):
+            return [self.import_entry(entry, feed_obj, now=now)
+                        for entry in entries]
+
+        self.logger.debug("ie: %s Importing %d entries..." % (
+            feed_obj.feed_url, len(entries)))
+
+        fields_list = [self.post_fields_parsed(entry, feed_obj, now=now)
+                            for entry in entries]
+        posts = manager.update_or_create_many(feed_obj, fields_list)
+
+        if self.include_enclosures:
+            manager.add_related_many("enclosures",
+                    [(post, self.get_enclosures(entry))
+                        for post, entry in zip(posts, entries)])
+        if self.include_categories:
+            manager.add_related_many("categories",
+                    [(post, self.get_categories(entry))
+                        for post, entry in zip(posts, entries)])
+
+        self.logger.debug("ie: %s Entries successfully imported..." % (
+            feed_obj.feed_url))
+
+        return posts
@@ -1,38 +1,83 @@
 from __future__ import with_statement
 
 import sys
+import socket
+from itertools import imap
 from optparse import make_option
+from multiprocessing.pool import ThreadPool
 
 from django.core.management.base import NoArgsCommand
+from django.db import close_connection
 
-from djangofeeds.tasks import refresh_feed
-from djangofeeds.models import Feed
+from djangofeeds import conf
+from djangofeeds.models import Feed, Category, Enclosure
 from djangofeeds.importers import FeedImporter
 
 
 def print_feed_summary(feed_obj):
     """Dump a summary of the feed (how many posts etc.)."""
-    posts = feed_obj.get_posts()
-    enclosures_count = sum([post.enclosures.count() for post in posts])
-    categories_count = sum([post.categories.count() for post in posts]) \
+    enclosures_count = Enclosure.objects.filter(post__feed=feed_obj).count()
+    categories_count = Category.objects.filter(post__feed=feed_obj).count() \
                         + feed_obj.categories.count()
     sys.stderr.write("*** Total %d posts, %d categories, %d enclosures\n" % \
-            (len(posts), categories_count, enclosures_count))
+            (feed_obj.get_post_count(), categories_count, enclosures_count))
 
 
-def refresh_all(verbose=True):
-    """ Refresh all feeds in the system. """
+def refresh_all(verbose=True, workers=None):
+    """ Refresh all feeds in the system.
+
+    Feeds are refreshed concurrently by a pool of ``workers`` threads
+    (default is :data:`djangofeeds.conf.REFRESH_WORKERS`). With a single
+    worker the feeds are refreshed one by one in the calling thread.
+
+    """
     importer = FeedImporter()
-    for feed_obj in importer.feed_model.objects.all():
+    workers = workers or conf.REFRESH_WORKERS
+
+    def refresh(feed_obj):
         sys.stderr.write(">>> Refreshing feed %s...\n" % \
                 (feed_obj.name))
-        feed_obj = importer.update_feed(feed_obj)
-
-        if verbose:
-            print_feed_summary(feed_obj)
+        try:
+            return importer.update_feed(feed_obj)
+        except Exception, exc:
+            sys.stderr.write("!!! Error refreshing feed %s: %r\n" % \
+                    (feed_obj.name, exc))
+
+    def refresh_in_thread(feed_obj):
+        try:
+            return refresh(feed_obj)
+        finally:
+            # Every thread gets a database connection of its own.
+            close_connection()
+
+    # The socket timeout is process global, so set it once for the whole
+    # batch instead of letting the worker threads change it under
+    # each other's feet.
+    prev_timeout = socket.getdefaulttimeout()
+    socket.setdefaulttimeout(importer.timeout)
+    pool = ThreadPool(workers) if workers > 1 else None
+    try:
+        # Fetch the feeds here, as the pool iterates over them in
+        # a thread of its own.
+        feeds = list(importer.feed_model.objects.all())
+        if pool is None:
+            refreshed = imap(refresh, feeds)
+        else:
+            refreshed = pool.imap_unordered(refresh_in_thread, feeds)
+        for feed_obj in refreshed:
+            if verbose and feed_obj is not None:
+                print_feed_summary(feed_obj)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        socket.setdefaulttimeout(prev_timeout)
 
 
 def refresh_all_feeds_delayed(from_file=None):
+    # Only needed here, so refresh_all works without celery.
+    from djangofeeds.tasks import refresh_feed
+
     urls = (feed.feed_url for feed in Feed.objects.all())
     if from_file is not None:
         with file(from_file) as feedfile:
@@ -4,6 +4,7 @@ from datetime import timedelta, datetime
 from django.db import models
 from django.db.models.query import QuerySet
 from django.core.exceptions import MultipleObjectsReturned
+from django.utils.encoding import force_unicode
 
 from djangofeeds.utils import truncate_field_data
 
@@ -24,6 +25,30 @@ def update_with_dict(obj, fields):
     return obj
 
 
+def changed_fields(obj, fields):
+    """Get the items of ``fields`` with values different from the
+    ones of the model instance ``obj``."""
+    opts = obj._meta
+    changed = {}
+    for name, value in fields.items():
+        field = opts.get_field(name)
+        if field.rel:
+            current, value = getattr(obj, field.attname), \
+                                getattr(value, "pk", value)
+        else:
+            current, value = getattr(obj, name), field.to_python(value)
+        if isinstance(value, str):
+            value = force_unicode(value, errors="replace")
+        try:
+            if current == value:
+                continue
+        except TypeError:
+            # e.g. naive and aware datetimes.
+            pass
+        changed[name] = fields[name]
+    return changed
+
+
 class ExtendedQuerySet(QuerySet):
 
     def update_or_create(self, **kwargs):
@@ -114,6 +139,97 @@ class PostManager(ExtendedManager):
             super_update(guid=defaults["guid"], feed=feed_obj,
                          defaults=defaults)
 
+    def update_or_create_many(self, feed_obj, fields_list):
+        """Update or create several posts for a feed at once.
+
+        Existing posts are fetched with a single query, and the new
+        posts are inserted with a single bulk insert. Existing posts
+        are only written if some of their fields changed, with one
+        ``UPDATE`` query each.
+
+        :returns: The list of posts, in the same order as ``fields_list``.
+
+        """
+        fields_list = [truncate_field_data(self.model, fields)
+                            for fields in fields_list]
+        # Entries sharing a guid end up as one post with the last values.
+        by_guid = dict((force_unicode(fields["guid"]), fields)
+                            for fields in fields_list)
+
+        # Depending on the collation, the database may match guids
+        # differing in case or trailing spaces, so only the rows with
+        # the exact same guid are used.
+        posts, duplicates = {}, set()
+        for post in self.filter(feed=feed_obj, guid__in=by_guid.keys()):
+            if post.guid not in by_guid:
+                continue
+            if post.guid in posts:
+                duplicates.add(post.guid)
+            posts[post.guid] = post
+        if duplicates:
+            self.filter(feed=feed_obj, guid__in=duplicates).delete()
+            for guid in duplicates:
+                del(posts[guid])
+
+        for guid, post in posts.items():
+            changed = changed_fields(post, by_guid[guid])
+            if changed:
+                self.filter(pk=post.pk).update(**changed)
+                for name, value in changed.items():
+                    setattr(post, name, value)
+
+        # Insert in the order of the entries, as posts published the
+        # same day are ordered by id.
+        new_guids, seen = [], set(posts)
+        for fields in fields_list:
+            guid = force_unicode(fields["guid"])
+            if guid not in seen:
+                seen.add(guid)
+                new_guids.append(guid)
+        if new_guids:
+            self.bulk_create([self.model(**by_guid[guid])
+                                for guid in new_guids])
+            # bulk_create doesn't set the primary keys, so fetch them.
+            new_guids = set(new_guids)
+            for post in self.filter(feed=feed_obj, guid__in=new_guids):
+                if post.guid in new_guids:
+                    posts[post.guid] = post
+
+        result = []
+        for fields in fields_list:
+            guid = force_unicode(fields["guid"])
+            post = posts.get(guid)
+            if post is None:
+                # Not found back after the insert (see above).
+                post = posts[guid] = self.create(**by_guid[guid])
+            result.append(post)
+        return result
+
+    def add_related_many(self, name, related):
+        """Add many-to-many relations to several posts at once.
+
+        :param name: Name of the many-to-many field, e.g.
+            ``"enclosures"``.
+        :param related: List of ``(post, objects)`` tuples.
+
+        """
+        field = self.model._meta.get_field(name)
+        through = field.rel.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+
+        wanted = set((post.pk, obj.pk) for post, objects in related
+                                            for obj in objects)
+        if not wanted:
+            return
+        existing = set(through.objects.filter(**{
+                    "%s__in" % source: [post.pk for post, _ in related]})
+                        .values_list(source, target))
+        through.objects.bulk_create([
+                through(**{"%s_id" % source: post_id,
+                           "%s_id" % target: obj_id})
+                    for post_id, obj_id in wanted - existing])
+
 
 class CategoryManager(ExtendedManager):
     pass
@@ -194,9 +194,9 @@ class Feed(models.Model):
 
         """
         by_date = self.post_set.order_by("-date_published")
-        if len(by_date) > max_posts:
-            expired_posts = [post["id"]
-                                for post in by_date.values("id")[min_posts:]]
+        if by_date.count() > max_posts:
+            expired_posts = list(by_date.values_list("id",
+                                                     flat=True)[min_posts:])
             Post.objects.filter(pk__in=expired_posts).delete()
             return len(expired_posts)
         return 0
@@ -0,0 +1,588 @@
+"""Alternative feed parsers.
+
+:class:`LxmlFeedParser` is a drop-in replacement for :mod:`feedparser`
+when used as :attr:`djangofeeds.importers.FeedImporter.parser`.
+RSS and Atom feeds are parsed with :mod:`lxml`, and JSON feeds with
+:mod:`json`, anything else is handed over to :mod:`feedparser`.
+
+:class:`SessionFeedParser` is :mod:`feedparser` downloading feeds
+with a shared :mod:`requests` session, and the default parser.
+
+Note that unlike :mod:`feedparser` it does not sanitize the HTML
+content of the posts, so only use it for feeds you trust::
+
+    class TrustedFeedImporter(FeedImporter):
+        parser = LxmlFeedParser()
+
+"""
+import re
+import json
+import socket
+import urllib2
+import urlparse
+import httplib as http
+
+from calendar import timegm
+from email.utils import formatdate
+from io import BytesIO
+
+import feedparser
+from feedparser import FeedParserDict
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    requests = None
+
+FEED_RSS = "rss"
+FEED_ATOM = "atom"
+FEED_JSON = "json"
+
+SNIFF_SIZE = 1024
+
+RSS_NAMESPACES = frozenset(["",
+                            "http://purl.org/rss/1.0/",
+                            "http://backend.userland.com/rss2",
+                            "http://purl.org/dc/elements/1.1/",
+                            "http://purl.org/rss/1.0/modules/content/"])
+ATOM_NAMESPACES = frozenset(["http://www.w3.org/2005/Atom",
+                             "http://purl.org/atom/ns#"])
+
+XML_ENCODING_RE = re.compile(
+        r"""^(\s*<\?xml[^>]*?encoding\s*=\s*)(["'])([^"']*)\2""")
+
+
+def _split_tag(tag):
+    """Split an element tag into its namespace and local name."""
+    if tag.startswith("{"):
+        return tag[1:].split("}", 1)
+    return "", tag
+
+
+def _localname(tag):
+    """Get the tag name without its namespace."""
+    return _split_tag(tag)[1]
+
+
+def _children(elem, namespaces):
+    """Iterate over the ``(name, child)`` pairs of an element,
+    skipping elements from namespaces we don't know about."""
+    for child in elem.iterchildren(tag=etree.Element):
+        namespace, name = _split_tag(child.tag)
+        if namespace in namespaces:
+            yield name, child
+
+
+def _parse_date(value):
+    return feedparser._parse_date(value) if value else None
+
+
+def _is_http(source):
+    return isinstance(source, basestring) and \
+            urlparse.urlparse(source).scheme in ("http", "https")
+
+
+def sniff_feed_type(data):
+    """Find the type of feed from the start of the document.
+
+    Returns one of :const:`FEED_RSS`, :const:`FEED_ATOM`,
+    :const:`FEED_JSON`, or :const:`None` if the type is not known.
+
+    """
+    head = data[:SNIFF_SIZE].lstrip().lower()
+    if head.startswith("{"):
+        return FEED_JSON
+    if "<rss" in head or "<rdf:rdf" in head:
+        return FEED_RSS
+    if "<feed" in head:
+        return FEED_ATOM
+
+
+class _RecordingStream(object):
+    """File-like wrapper around a stream that has its head read already.
+
+    With ``record`` enabled it remembers everything that has been read,
+    so the document can be handed to another parser if needed.
+
+    :param head: Data already read from the stream.
+    :keyword record: Keep the data read. (Default: :const:`True`.)
+
+    """
+
+    def __init__(self, head, stream, record=True):
+        self.stream = stream
+        self.chunks = [head]
+        self.pending = head
+        self.record = record
+
+    def read(self, size=-1):
+        if self.pending:
+            data, self.pending = self.pending, ""
+            return data
+        data = self.stream.read(size) if size >= 0 else self.stream.read()
+        if self.record:
+            self.chunks.append(data)
+        else:
+            self.chunks = None
+        return data
+
+    def getvalue(self):
+        """Get the whole document, reading the rest of the stream.
+
+        Returns :const:`None` if part of the document has been read
+        without being recorded.
+
+        """
+        if self.chunks is None:
+            return None
+        self.chunks.append(self.stream.read())
+        self.pending = ""
+        return "".join(self.chunks)
+
+
+class FeedFetcher(object):
+    """Downloads feeds over HTTP for the parsers.
+
+    .. attribute:: pool_size
+
+        Number of connections to keep open per host, when feeds are
+        downloaded with :mod:`requests`. Should be at least the number
+        of threads refreshing feeds. (Default: 32.)
+
+    """
+    pool_size = 32
+    session = None
+
+    def fetch(self, url, result, etag=None, modified=None, timeout=None):
+        """Open feed for download, saving the HTTP details in ``result``.
+
+        Uses the shared :mod:`requests` session if available,
+        otherwise :mod:`urllib2`.
+
+        The ``timeout`` (in seconds) is set on the connection only,
+        the default is the socket default timeout.
+
+        Returns the response to read the feed from, or :const:`None` if
+        there is nothing to parse.
+
+        """
+        headers = {"User-Agent": feedparser.USER_AGENT}
+        if etag:
+            headers["If-None-Match"] = etag
+        if modified:
+            headers["If-Modified-Since"] = formatdate(timegm(modified),
+                                                      usegmt=True)
+        result["href"] = url
+        timeout = timeout or socket.getdefaulttimeout()
+        if requests is None:
+            return self.fetch_with_urllib2(url, result, headers, timeout)
+        return self.fetch_with_requests(url, result, headers, timeout)
+
+    def get_session(self):
+        """Get the :class:`requests.Session` shared by all parsers.
+
+        Reusing the session keeps the connections to the feed servers
+        open between feeds, saving the TCP and TLS handshakes.
+
+        """
+        if self.session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.pool_size,
+                                  pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            FeedFetcher.session = session
+        return self.session
+
+    def fetch_with_requests(self, url, result, headers, timeout=None):
+        try:
+            response = self.get_session().get(url, headers=headers,
+                                stream=True,
+                                timeout=timeout)
+        except requests.Timeout, exc:
+            raise socket.timeout(str(exc))
+
+        result["status"] = response.status_code
+        result["href"] = response.url
+        if response.status_code == http.NOT_MODIFIED or \
+                response.status_code >= http.BAD_REQUEST:
+            response.close()
+            return None
+        if response.history:
+            # Report redirects like feedparser does, so moved feeds
+            # can be updated.
+            result["status"] = response.history[-1].status_code
+        # The body is decoded below, so drop its encoding.
+        headers = response.headers.copy()
+        headers.pop("content-encoding", None)
+        result["headers"] = dict(headers)
+        if response.headers.get("etag"):
+            result["etag"] = response.headers["etag"]
+        if response.headers.get("last-modified"):
+            result["modified"] = _parse_date(
+                    response.headers["last-modified"])
+        # Read the body as sent, but without the transfer encoding.
+        response.raw.decode_content = True
+        return response.raw
+
+    def fetch_with_urllib2(self, url, result, headers, timeout=None):
+        try:
+            response = urllib2.urlopen(urllib2.Request(url, headers=headers),
+                                       timeout=timeout)
+        except urllib2.HTTPError, exc:
+            result["status"] = exc.code
+            return None
+        except urllib2.URLError, exc:
+            if isinstance(exc.reason, socket.timeout):
+                raise exc.reason
+            raise
+
+        result["status"] = response.getcode() or http.OK
+        result["href"] = response.geturl()
+        headers = response.info()
+        result["headers"] = dict(headers)
+        if headers.get("etag"):
+            result["etag"] = headers["etag"]
+        if headers.get("last-modified"):
+            result["modified"] = _parse_date(headers["last-modified"])
+        return response
+
+
+class SessionFeedParser(FeedFetcher):
+    """:mod:`feedparser`, but downloading feeds with the shared
+    :mod:`requests` session, so the connections to the feed servers
+    are reused between feeds.
+
+    This is the default parser of
+    :class:`djangofeeds.importers.FeedImporter`. Without :mod:`requests`
+    feeds are downloaded with :mod:`urllib2`.
+
+    """
+
+    def parse(self, url_file_stream_or_string, etag=None, modified=None,
+            timeout=None):
+        """Parse a feed, see :func:`feedparser.parse`.
+
+        :keyword timeout: Timeout in seconds for downloading the feed.
+            (Default: the socket default timeout.)
+
+        """
+        source = url_file_stream_or_string
+        if not _is_http(source):
+            return feedparser.parse(source, etag=etag, modified=modified)
+
+        result = FeedParserDict(feed=FeedParserDict(), entries=[], bozo=0)
+        try:
+            stream = self.fetch(source, result, etag=etag, modified=modified,
+                                timeout=timeout)
+        except socket.timeout:
+            raise
+        except Exception, exc:
+            # Same as feedparser, which doesn't raise for network errors.
+            result["bozo"] = 1
+            result["bozo_exception"] = exc
+            return result
+        if stream is None:
+            return result
+        try:
+            # Only pass the body, or feedparser would use the headers
+            # of the stream, and decode the already decoded body again.
+            feed = feedparser.parse(BytesIO(stream.read()),
+                                    response_headers=result["headers"])
+        finally:
+            stream.close()
+        for key in ("status", "href", "etag"):
+            if key in result:
+                feed[key] = result[key]
+        return feed
+
+
+class LxmlFeedParser(FeedFetcher):
+    """Feed parser returning the same structure as
+    :func:`feedparser.parse`, for the fields used by the importer.
+
+    XML feeds are parsed straight from the network (or file) stream,
+    and every post entry is released from the tree once it's converted,
+    so the memory used doesn't grow with the size of the document.
+    The exceptions are feeds not declared as UTF-8, JSON feeds, and
+    file objects passed in by the caller, which are read whole.
+    If an XML feed turns out to be invalid halfway, it is read again
+    (downloaded again for URLs) to hand it over to :attr:`fallback`.
+
+    :keyword max_entries: See :attr:`max_entries`.
+
+    .. attribute:: max_entries
+
+        Stop reading the feed after this many post entries.
+        Only use this for feeds that list the most recent posts
+        first. (Default: no limit.)
+
+    .. attribute:: fallback
+
+        Parser used for feeds that can't be handled.
+        (Default: :mod:`feedparser`.)
+
+    """
+    max_entries = None
+    fallback = feedparser
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or self.max_entries
+
+    def parse(self, url_file_stream_or_string, etag=None, modified=None,
+            timeout=None):
+        """Parse a feed.
+
+        :param url_file_stream_or_string: URL, path, file object or
+            document to parse.
+        :keyword etag: E-tag received from last parse (if any).
+        :keyword modified: ``Last-Modified`` date received from last
+            parse (if any), as a time tuple.
+        :keyword timeout: Timeout in seconds for downloading the feed.
+            (Default: the socket default timeout.)
+
+        """
+        source = url_file_stream_or_string
+        if etree is None:
+            return self.fallback.parse(source, etag=etag, modified=modified)
+
+        result = FeedParserDict(feed=FeedParserDict(), entries=[], bozo=0)
+        reopen = None
+        if _is_http(source):
+            stream = self.fetch(source, result, etag=etag, modified=modified,
+                                timeout=timeout)
+            if stream is None:
+                return result
+            reopen = lambda: self.fetch(source, FeedParserDict(),
+                                        timeout=timeout)
+        elif hasattr(source, "read"):
+            stream = source
+        else:
+            try:
+                stream = open(source, "rb")
+                reopen = lambda: open(source, "rb")
+            except (IOError, OSError, TypeError, ValueError):
+                if isinstance(source, unicode):
+                    source = source.encode("utf-8")
+                stream = BytesIO(source)
+                reopen = lambda: BytesIO(source)
+
+        try:
+            return self.parse_stream(stream, result, reopen=reopen)
+        finally:
+            if stream is not source:
+                stream.close()
+
+    def parse_stream(self, stream, result, reopen=None):
+        """Parse feed from a stream.
+
+        :keyword reopen: Function returning a new stream for the same
+            document, or :const:`None` for the stream to be recorded
+            in case it needs to be parsed again.
+
+        """
+        head = stream.read(SNIFF_SIZE)
+        stream = _RecordingStream(head, stream, record=reopen is None)
+
+        kind = sniff_feed_type(head)
+        try:
+            if kind == FEED_JSON:
+                self.parse_json(stream.getvalue(), result)
+            elif kind is not None:
+                if not self.declares_utf8(head):
+                    stream = BytesIO(self.fix_encoding(stream.getvalue()))
+                self.parse_xml(stream, result, kind)
+            else:
+                return self.parse_fallback(stream.getvalue(), result)
+        except (ValueError, etree.XMLSyntaxError):
+            return self.parse_fallback(self.read_again(stream, reopen),
+                                       result)
+        return result
+
+    def read_again(self, stream, reopen):
+        """Get the whole document of a stream that has been (partly)
+        parsed already."""
+        data = stream.getvalue()
+        if data is not None:
+            return data
+        stream = reopen()
+        if stream is None:
+            return ""
+        try:
+            return stream.read()
+        finally:
+            stream.close()
+
+    def parse_fallback(self, data, result):
+        feed = self.fallback.parse(data)
+        for key in ("status", "href", "etag", "modified"):
+            if key in result:
+                feed[key] = result[key]
+        return feed
+
+    def parse_xml(self, stream, result, kind):
+        """Parse RSS or Atom feed, one post entry at a time."""
+        if kind == FEED_RSS:
+            entry_tag, namespaces = "item", RSS_NAMESPACES
+            build_entry = self.rss_entry
+        else:
+            entry_tag, namespaces = "entry", ATOM_NAMESPACES
+            build_entry = self.atom_entry
+        channel, entries = result["feed"], result["entries"]
+        # Never let a feed make us read local files or other URLs
+        # through entities or DTDs.
+        elements = etree.iterparse(stream, events=("end", ),
+                                   resolve_entities=False,
+                                   no_network=True,
+                                   load_dtd=False,
+                                   huge_tree=False)
+        for _, elem in elements:
+            if not isinstance(elem.tag, basestring):
+                continue
+            namespace, name = _split_tag(elem.tag)
+            if namespace not in namespaces:
+                continue
+            if name == entry_tag:
+                entries.append(build_entry(elem))
+                # Release the entry, and the ones before it.
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del(elem.getparent()[0])
+                if self.max_entries and len(entries) >= self.max_entries:
+                    break
+                continue
+            parent = elem.getparent()
+            if parent is not None and \
+                    _localname(parent.tag) in ("channel", "feed"):
+                if name == "title":
+                    channel["title"] = self.text(elem)
+                elif name in ("description", "subtitle"):
+                    channel["subtitle"] = self.text(elem)
+                elif name == "link" and "link" not in channel:
+                    channel["link"] = elem.get("href") or self.text(elem)
+
+    def declares_utf8(self, head):
+        """Does the document declare to be UTF-8 (the default)?"""
+        match = XML_ENCODING_RE.match(head)
+        return not match or \
+                match.group(3).lower().replace("_", "-") in ("utf-8", "utf8")
+
+    def fix_encoding(self, data):
+        """Feeds are often UTF-8 even when they declare otherwise, so
+        read the document as UTF-8 whenever it is valid UTF-8."""
+        try:
+            data.decode("utf-8")
+        except UnicodeDecodeError:
+            return data
+        return XML_ENCODING_RE.sub(r'\g<1>\g<2>utf-8\g<2>', data, 1)
+
+    def parse_json(self, data, result):
+        """Parse `JSON Feed <https://jsonfeed.org>`_."""
+        document = json.loads(data)
+        result["feed"].update(title=document.get("title", ""),
+                              subtitle=document.get("description", ""),
+                              link=document.get("home_page_url", ""))
+        for item in document.get("items") or []:
+            entry = FeedParserDict(
+                id=item.get("id"),
+                link=item.get("url"),
+                title=item.get("title", ""),
+                author=(item.get("author") or {}).get("name", ""),
+                summary=item.get("summary", ""),
+                tags=[FeedParserDict(term=tag, scheme=None, label=None)
+                        for tag in item.get("tags") or []],
+                links=[FeedParserDict(rel="enclosure",
+                                      href=attachment.get("url"),
+                                      type=attachment.get("mime_type", ""),
+                                      length=str(attachment.get(
+                                                "size_in_bytes", 0)))
+                        for attachment in item.get("attachments") or []],
+            )
+            content = item.get("content_html") or item.get("content_text")
+            if content:
+                entry["content"] = [FeedParserDict(value=content)]
+            entry["published_parsed"] = _parse_date(
+                    item.get("date_published"))
+            entry["updated_parsed"] = _parse_date(
+                    item.get("date_modified")) or entry["published_parsed"]
+            result["entries"].append(entry)
+
+    def text(self, elem):
+        """Get the text of an element, or the markup of its children if
+        it contains XHTML."""
+        if elem.get("type") == "xhtml":
+            return (elem.text or "") + "".join(
+                    etree.tostring(child, encoding=unicode)
+                        for child in elem)
+        return (elem.text or "").strip()
+
+    def rss_entry(self, elem):
+        entry = FeedParserDict(links=[], tags=[])
+        for name, child in _children(elem, RSS_NAMESPACES):
+            if name == "title":
+                entry["title"] = self.text(child)
+            elif name == "link":
+                entry["link"] = self.text(child)
+            elif name == "guid":
+                entry["id"] = self.text(child)
+            elif name == "author":
+                entry["author"] = self.text(child)
+            elif name == "creator":
+                entry.setdefault("author", self.text(child))
+            elif name == "description":
+                entry["summary"] = self.text(child)
+            elif name == "encoded":
+                entry["content"] = [FeedParserDict(value=self.text(child))]
+            elif name in ("pubDate", "date"):
+                entry["published_parsed"] = _parse_date(self.text(child))
+            elif name == "category":
+                entry["tags"].append(FeedParserDict(term=self.text(child),
+                                                    scheme=child.get("domain"),
+                                                    label=None))
+            elif name == "enclosure":
+                entry["links"].append(FeedParserDict(rel="enclosure",
+                                        href=child.get("url"),
+                                        type=child.get("type", ""),
+                                        length=child.get("length", "0")))
+        return entry
+
+    def atom_entry(self, elem):
+        entry = FeedParserDict(links=[], tags=[])
+        for name, child in _children(elem, ATOM_NAMESPACES):
+            if name == "title":
+                entry["title"] = self.text(child)
+            elif name == "id":
+                entry["id"] = self.text(child)
+            elif name == "author":
+                names = [self.text(part)
+                            for part_name, part in _children(child,
+                                                        ATOM_NAMESPACES)
+                                if part_name == "name"]
+                entry["author"] = names and names[0] or ""
+            elif name == "summary":
+                entry["summary"] = self.text(child)
+            elif name == "content":
+                entry["content"] = [FeedParserDict(value=self.text(child))]
+            elif name in ("published", "issued"):
+                entry["published_parsed"] = _parse_date(self.text(child))
+            elif name in ("updated", "modified"):
+                entry["updated_parsed"] = _parse_date(self.text(child))
+            elif name == "category":
+                entry["tags"].append(FeedParserDict(term=child.get("term"),
+                                                    scheme=child.get("scheme"),
+                                                    label=child.get("label")))
+            elif name == "link":
+                rel = child.get("rel", "alternate")
+                entry["links"].append(FeedParserDict(rel=rel,
+                                        href=child.get("href"),
+                                        type=child.get("type", ""),
+                                        length=child.get("length", "0")))
+                if rel == "alternate" and "link" not in entry:
+                    entry["link"] = child.get("href")
+        return entry
@@ -10,3 +10,7 @@ class TestConf(unittest.TestCase):
         self.assertEqual(conf._interval(timedelta(seconds=10)),
                           timedelta(seconds=10))
         self.assertEqual(conf._interval(30), timedelta(seconds=30))
+
+    def test_refresh_workers_sqlite(self):
+        # The test database is SQLite.
+        self.assertEqual(conf.REFRESH_WORKERS, 1)
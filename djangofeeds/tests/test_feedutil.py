@@ -33,6 +33,21 @@ class test_date_to_datetime(unittest.TestCase):
         self.assertTupleEqual((date.year, date.month, date.day),
                               (now.year, now.month, now.day))
 
+    def test_no_date_uses_now(self):
+        x = date_to_datetime("date_test")
+        now = datetime(2010, 11, 29, 17, 12, 26, tzinfo=pytz.utc)
+        self.assertEqual(x(None, {}, now), now)
+        self.assertEqual(x(None, {"date_test": object()}, now), now)
+
+    def test_repeated_date_is_cached(self):
+        x = date_to_datetime("date_test")
+        parsed = (2010, 11, 29, 17, 12, 26, 0, 333, 0)
+        first = x(None, {"date_test": parsed})
+        second = x(None, {"date_test": list(parsed)})
+        self.assertIs(first, second)
+        self.assertTupleEqual((first.year, first.month, first.day),
+                              (2010, 11, 29))
+
 
 class test_find_post_content(unittest.TestCase):
 
@@ -45,7 +60,7 @@ class test_find_post_content(unittest.TestCase):
         feedutil.truncate_html_words = raise_UnicodeDecodeError
         try:
             self.assertEqual(find_post_content(None, {
-                                "description": "foobarbaz"}), "")
+                                "description": "foobarbaz " * 200}), "")
         finally:
             feedutil.truncate_html_words = prev
 
@@ -66,6 +81,19 @@ class test_find_post_content(unittest.TestCase):
             self.assertTrue(post.find(elem) != -1, elem)
 
 
+class test_truncate_words_fast(unittest.TestCase):
+
+    def test_short_text_is_unchanged(self):
+        html = u"<p>The <b>quick</b> brown fox</p>"
+        self.assertEqual(feedutil.truncate_words_fast(html, 4), html)
+
+    def test_same_as_truncate_html_words(self):
+        html = u"<p>The <b>quick</b> brown fox &amp; the lazy-dog</p>"
+        for num in range(1, 10):
+            self.assertEqual(feedutil.truncate_words_fast(html, num),
+                             feedutil.truncate_html_words(html, num))
+
+
 class test_generate_guid(unittest.TestCase):
 
     def test_handles_not_encodable_text(self):
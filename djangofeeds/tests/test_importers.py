@@ -14,12 +14,13 @@ from UserDict import UserDict
 from contextlib import nested
 from django.contrib.auth import authenticate
 
-from djangofeeds.importers import FeedImporter
+from djangofeeds.importers import FeedImporter, compile_post_field_handlers
 from djangofeeds.exceptions import FeedCriticalError
 from djangofeeds.exceptions import TimeoutError, FeedNotFoundError
 from djangofeeds import models
 from djangofeeds.models import Feed, Post
 from djangofeeds import feedutil
+from djangofeeds import parsers
 
 data_path = os.path.join(os.path.dirname(__file__), "data")
 
@@ -287,6 +288,18 @@ src="http://www.labandepasdessinee.com/bpd/images/saison3/261
         feed_obj = _Verify().update_feed(feed_obj=feed_obj, force=True)
         self.assertEqual(feed_obj.last_error, models.FEED_NOT_FOUND_ERROR)
 
+    def test_update_feed_stores_refresh(self):
+        Feed.objects.all().delete()
+        importer = FeedImporter(update_on_import=False)
+        feed_obj = importer.import_feed(self.feed, local=True, force=True)
+        feed_obj.save_generic_error()
+
+        feed_obj = importer.update_feed(feed_obj=feed_obj, force=True)
+        stored = Feed.objects.get(pk=feed_obj.pk)
+        self.assertEqual(stored.last_error, u"")
+        self.assertEqual(stored.date_last_refresh, feed_obj.date_last_refresh)
+        self.assertEqual(stored.name, feed_obj.name)
+
     def test_parse_feed_raises(self):
 
         class _RaisingFeedImporter(FeedImporter):
@@ -435,3 +448,103 @@ src="http://www.labandepasdessinee.com/bpd/images/saison3/261
                                                             force=True)
         self.assertEqual(imported_feed.post_set.count(), post_count,
             "Posts seems to be imported twice.")
+
+    def test_post_fields_parsed(self):
+        feed = feedparser.parse(get_data_filename("example_feed.rss"))
+        feed_obj = Feed(feed_url="http://example.com/feed")
+        entry = feedutil.entries_by_date(feed.entries)[0]
+        fields = self.importer.post_fields_parsed(entry, feed_obj)
+        self.assertDictEqual(fields, dict(
+            (key, handler(feed_obj, entry)) for key, handler in
+                FeedImporter.post_field_handlers.items()))
+
+    def test_custom_post_field_handlers(self):
+
+        class TitleImporter(FeedImporter):
+            post_field_handlers = dict(FeedImporter.post_field_handlers,
+                    title=lambda feed_obj, entry: "custom title")
+
+        feed = feedparser.parse(get_data_filename("example_feed.rss"))
+        feed_obj = Feed(feed_url="http://example.com/feed")
+        entry = feedutil.entries_by_date(feed.entries)[0]
+        fields = TitleImporter().post_fields_parsed(entry, feed_obj)
+        self.assertEqual(fields["title"], "custom title")
+        self.assertDictEqual(fields, dict(
+            (key, handler(feed_obj, entry)) for key, handler in
+                TitleImporter.post_field_handlers.items()))
+
+    def test_overridden_import_entry_is_used(self):
+        imported = []
+
+        class _Verify(FeedImporter):
+
+            def import_entry(self, entry, feed_obj):
+                imported.append(entry)
+                return super(_Verify, self).import_entry(entry, feed_obj)
+
+        Feed.objects.all().delete()
+        feed_obj = _Verify().import_feed(self.feed, local=True, force=True)
+        self.assertEqual(len(imported), 20)
+        self.assertEqual(feed_obj.get_post_count(), 20)
+
+    def test_import_entries_without_bulk_manager(self):
+
+        class _SingleManager(object):
+
+            def update_or_create(self, feed_obj, **fields):
+                return Post.objects.update_or_create(feed_obj, **fields)
+
+        class _SinglePost(object):
+            objects = _SingleManager()
+
+        Feed.objects.all().delete()
+        importer = FeedImporter()
+        importer.post_model = _SinglePost
+        feed_obj = importer.import_feed(self.feed, local=True, force=True)
+        self.assertEqual(feed_obj.get_post_count(), 20)
+
+    def test_parse_feed_timeout(self):
+        seen = []
+
+        class _Parser(parsers.SessionFeedParser):
+
+            def parse(self, url, etag=None, modified=None, timeout=None):
+                seen.append((timeout, socket.getdefaulttimeout()))
+                return {}
+
+        class _PlainParser(object):
+
+            def parse(self, url, etag=None, modified=None):
+                seen.append(socket.getdefaulttimeout())
+                return {}
+
+        prev_timeout = socket.getdefaulttimeout()
+        importer = FeedImporter(timeout=7)
+        importer.parser = _Parser()
+        importer.parse_feed(self.feed)
+        self.assertListEqual(seen, [(7, prev_timeout)])
+
+        # Parsers not taking a timeout get the socket default timeout.
+        importer.parser = _PlainParser()
+        importer.parse_feed(self.feed)
+        self.assertEqual(seen[-1], 7)
+        self.assertEqual(socket.getdefaulttimeout(), prev_timeout)
+
+    def test_compile_post_field_handlers(self):
+        handlers = {"title": lambda feed_obj, entry: entry["title"],
+                    "feed's": lambda feed_obj, entry: feed_obj}
+        parse_fields = compile_post_field_handlers(handlers)
+        self.assertIs(compile_post_field_handlers(dict(handlers)),
+                      parse_fields)
+        self.assertDictEqual(parse_fields(handlers, "feed", {"title": "t"}),
+                             {"title": "t", "feed's": "feed"})
+
+    def test_create_category_is_cached(self):
+        importer = FeedImporter()
+        category = importer.create_category(" example.com ", " cached ")
+        self.assertEqual((category.domain, category.name),
+                         ("example.com", "cached"))
+        self.assertIs(importer.create_category("example.com", "cached"),
+                      category)
+        self.assertEqual(models.Category.objects.filter(
+                            name="cached").count(), 1)
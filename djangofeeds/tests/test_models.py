@@ -6,6 +6,7 @@ from uuid import uuid4
 
 from djangofeeds import models
 from djangofeeds.utils import naturaldate
+from django.db import connection
 from django.utils.timezone import utc
 
 
@@ -51,6 +52,53 @@ class TestPost(unittest.TestCase):
 
         self.assertNotEqual(p1.auto_guid(), p2.auto_guid())
 
+    def test_update_or_create_many(self):
+        now = datetime.now(pytz.utc)
+
+        def fields(guid, title):
+            return {"feed": self.feed, "guid": guid, "title": title,
+                    "link": "http://example.com/" + guid,
+                    "date_published": now, "date_updated": now}
+
+        models.Post.objects.create(**fields("a", "old"))
+        posts = models.Post.objects.update_or_create_many(self.feed, [
+                    fields("a", "new"), fields("b", "b"), fields("c", "c")])
+        self.assertListEqual([post.guid for post in posts],
+                             [u"a", u"b", u"c"])
+        self.assertTrue(all(post.pk for post in posts))
+        self.assertEqual(self.feed.post_set.count(), 3)
+        self.assertEqual(self.feed.post_set.get(guid="a").title, "new")
+
+        # Unchanged posts are not written again.
+        connection.use_debug_cursor = True
+        del(connection.queries[:])
+        try:
+            posts = models.Post.objects.update_or_create_many(self.feed, [
+                        fields("a", "new"), fields("b", "b")])
+            self.assertEqual(len(connection.queries), 1)
+            posts = models.Post.objects.update_or_create_many(self.feed, [
+                        fields("a", "newer"), fields("b", "b")])
+            self.assertEqual(len(connection.queries), 3)
+        finally:
+            connection.use_debug_cursor = None
+        self.assertEqual(posts[0].title, "newer")
+        self.assertEqual(self.feed.post_set.get(guid="a").title, "newer")
+
+    def test_update_or_create_many_keeps_entry_order(self):
+        now = datetime.now(pytz.utc)
+        guids = ["Lifehacker-%d" % i for i in (5147831, 5147677, 5146432,
+                                              5147537, 5147316, 5146968)]
+        posts = models.Post.objects.update_or_create_many(self.feed, [
+                    {"feed": self.feed, "guid": guid, "title": guid,
+                     "link": "http://example.com/" + guid,
+                     "date_published": now, "date_updated": now}
+                        for guid in guids + guids[:2]])
+        self.assertListEqual([post.guid for post in posts],
+                             guids + guids[:2])
+        self.assertListEqual(list(self.feed.post_set.order_by("id")
+                                    .values_list("guid", flat=True)),
+                             guids)
+
     def test_date_published_naturaldate(self):
         now = datetime.now(pytz.utc)
         day = datetime(now.year, now.month, now.day, tzinfo=utc)
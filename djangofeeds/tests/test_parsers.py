@@ -0,0 +1,330 @@
+from __future__ import with_statement
+
+import os
+import gzip
+import json
+import time
+import socket
+import tempfile
+import threading
+import unittest2 as unittest
+import feedparser
+import httplib as http
+from io import BytesIO
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+from djangofeeds import conf
+from djangofeeds import parsers
+from djangofeeds.exceptions import FeedCriticalError
+from djangofeeds.parsers import LxmlFeedParser, sniff_feed_type
+from djangofeeds.importers import FeedImporter
+from djangofeeds.tests.test_importers import get_data_filename, data_path
+from djangofeeds.tests.test_importers import get_data_file
+
+ENTRY_FIELDS = ("title", "link", "guid", "published_parsed")
+
+
+@unittest.skipIf(parsers.etree is None, "lxml not installed")
+class test_LxmlFeedParser(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = LxmlFeedParser()
+
+    def assertSameAsFeedparser(self, name):
+        filename = get_data_filename(name)
+        expected = feedparser.parse(filename)
+        feed = self.parser.parse(filename)
+        self.assertEqual(feed.channel.get("title"),
+                         expected.channel.get("title"))
+        self.assertEqual(len(feed.entries), len(expected.entries))
+        for entry, expected_entry in zip(feed.entries, expected.entries):
+            for field in ENTRY_FIELDS:
+                self.assertEqual(entry.get(field), expected_entry.get(field))
+            self.assertEqual(len(entry.enclosures),
+                             len(expected_entry.enclosures))
+
+    def test_rss(self):
+        self.assertSameAsFeedparser("example_feed.rss")
+        self.assertSameAsFeedparser("dailymotion.rss")
+
+    def test_rss_wrong_encoding_declared(self):
+        self.assertSameAsFeedparser("buggy_dates.rss")
+
+    def test_atom(self):
+        self.assertSameAsFeedparser("t1.xml")
+
+    def test_max_entries(self):
+        parser = LxmlFeedParser(max_entries=5)
+        feed = parser.parse(get_data_filename("example_feed.rss"))
+        self.assertEqual(len(feed.entries), 5)
+        self.assertEqual(feed.channel.title, "Lifehacker")
+
+    def test_falls_back_on_invalid_xml(self):
+        feed = self.parser.parse("<rss><channel><title>Broken</title>"
+                                 "<item><title>First</title></item>")
+        self.assertEqual(feed.entries[0].title, "First")
+
+    def test_falls_back_on_invalid_xml_file(self):
+        items = "".join("<item><title>Entry %d</title></item>" % i
+                            for i in range(200))
+        document = tempfile.NamedTemporaryFile(suffix=".rss")
+        document.write("<rss><channel><title>Broken</title>%s"
+                       "<item><title>Last</item>" % items)
+        document.flush()
+        try:
+            feed = self.parser.parse(document.name)
+        finally:
+            document.close()
+        self.assertEqual(feed.channel.title, "Broken")
+        self.assertEqual(feed.entries[0].title, "Entry 0")
+
+    def test_recording_stream(self):
+        stream = parsers._RecordingStream("head", BytesIO("body"))
+        self.assertEqual(stream.read(), "head")
+        self.assertEqual(stream.read(), "body")
+        self.assertEqual(stream.getvalue(), "headbody")
+
+        stream = parsers._RecordingStream("head", BytesIO("body"),
+                                          record=False)
+        self.assertEqual(stream.read(), "head")
+        self.assertEqual(stream.read(), "body")
+        self.assertIsNone(stream.chunks)
+        self.assertIsNone(stream.getvalue())
+
+    def test_external_entities_are_not_resolved(self):
+        secret = tempfile.NamedTemporaryFile(suffix=".txt")
+        secret.write("TOPSECRET")
+        secret.flush()
+        try:
+            feed = self.parser.parse(
+                '<?xml version="1.0"?>\n'
+                '<!DOCTYPE rss [<!ENTITY x SYSTEM "file://%s">]>\n'
+                '<rss><channel><title>Feed</title>'
+                '<item><title>&x;</title></item></channel></rss>' % (
+                    secret.name, ))
+        finally:
+            secret.close()
+        self.assertEqual(len(feed.entries), 1)
+        self.assertNotIn("TOPSECRET", feed.entries[0].get("title", ""))
+
+    def test_json(self):
+        feed = self.parser.parse(json.dumps({
+            "version": "https://jsonfeed.org/version/1",
+            "title": "JSON Feed",
+            "items": [{"id": "1", "url": "http://example.com/1",
+                       "title": "First",
+                       "content_html": "<p>Hello</p>",
+                       "date_published": "2010-02-07T14:04:00-05:00"}]}))
+        self.assertEqual(feed.channel.title, "JSON Feed")
+        entry = feed.entries[0]
+        self.assertEqual(entry.guid, "1")
+        self.assertEqual(entry.content[0].value, "<p>Hello</p>")
+        self.assertEqual(tuple(entry.published_parsed[:4]),
+                         (2010, 2, 7, 19))
+
+    def test_sniff_feed_type(self):
+        self.assertEqual(sniff_feed_type('<?xml version="1.0"?>\n<rss>'),
+                         parsers.FEED_RSS)
+        self.assertEqual(sniff_feed_type("<feed xmlns=''>"),
+                         parsers.FEED_ATOM)
+        self.assertEqual(sniff_feed_type(' {"items": []}'),
+                         parsers.FEED_JSON)
+        self.assertIsNone(sniff_feed_type("<opml>"))
+
+    def test_import_feed(self):
+
+        class LxmlFeedImporter(FeedImporter):
+            parser = LxmlFeedParser()
+
+        feed_obj = LxmlFeedImporter().import_feed(
+                    get_data_filename("example_feed.rss"), local=True)
+        self.assertEqual(feed_obj.name, "Lifehacker")
+        self.assertEqual(feed_obj.get_post_count(), 20)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def translate_path(self, path):
+        return os.path.join(data_path, path.lstrip("/"))
+
+    def log_message(self, *args):
+        pass
+
+
+class ConditionalHandler(QuietHandler):
+    """Handler answering 304 to requests with :attr:`etag`, redirecting
+    ``/moved.rss``, serving a compressed feed at ``/gzip.rss``, and
+    recording the methods of the requests made."""
+    etag = '"v1"'
+    methods = []
+
+    def send_head(self):
+        self.methods.append(self.command)
+        if self.path == "/slow.rss":
+            time.sleep(1)
+            self.send_error(http.NOT_FOUND)
+            return None
+        if self.path == "/gzip.rss":
+            body = BytesIO()
+            with gzip.GzipFile(fileobj=body, mode="wb") as compressed:
+                compressed.write(get_data_file("example_feed.rss"))
+            self.send_response(http.OK)
+            self.send_header("Content-Type", "application/rss+xml")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body.getvalue())))
+            self.end_headers()
+            body.seek(0)
+            return body
+        if self.path == "/moved.rss":
+            self.send_response(http.MOVED_PERMANENTLY)
+            self.send_header("Location", "/example_feed.rss")
+            self.end_headers()
+            return None
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(http.NOT_MODIFIED)
+            self.end_headers()
+            return None
+        return QuietHandler.send_head(self)
+
+
+class NoHeadHandler(ConditionalHandler):
+
+    def do_HEAD(self):
+        self.methods.append(self.command)
+        self.send_error(http.METHOD_NOT_ALLOWED)
+
+
+class HTTPServerCase(unittest.TestCase):
+    handler = QuietHandler
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), self.handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = "http://127.0.0.1:%d/" % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class test_FeedImporter_parse_feed_http(HTTPServerCase):
+    handler = ConditionalHandler
+
+    def setUp(self):
+        super(test_FeedImporter_parse_feed_http, self).setUp()
+        del(self.handler.methods[:])
+        self.importer = FeedImporter()
+        self.feed_url = self.url + "example_feed.rss"
+
+    def test_no_head_without_maxlen(self):
+        feed = self.importer.parse_feed(self.feed_url, etag='"v0"')
+        self.assertEqual(len(feed.entries), 40)
+        self.assertListEqual(self.handler.methods, ["GET"])
+
+    def test_not_modified(self):
+        feed = self.importer.parse_feed(self.feed_url, etag='"v1"',
+                                        maxlen=10 ** 7)
+        self.assertEqual(feed.status, http.NOT_MODIFIED)
+        self.assertListEqual(feed.entries, [])
+        self.assertListEqual(self.handler.methods, ["HEAD"])
+
+    def test_maxlen(self):
+        feed = self.importer.parse_feed(self.feed_url, maxlen=10 ** 7)
+        self.assertEqual(len(feed.entries), 40)
+        self.assertListEqual(self.handler.methods, ["HEAD", "GET"])
+        with self.assertRaises(FeedCriticalError):
+            self.importer.parse_feed(self.feed_url, maxlen=1024)
+
+    def test_MAX_FEED_BYTES(self):
+        prev, conf.MAX_FEED_BYTES = conf.MAX_FEED_BYTES, 1024
+        try:
+            with self.assertRaises(FeedCriticalError):
+                self.importer.parse_feed(self.feed_url)
+        finally:
+            conf.MAX_FEED_BYTES = prev
+        self.assertListEqual(self.handler.methods, ["HEAD"])
+
+
+@unittest.skipIf(parsers.requests is None, "requests not installed")
+class test_SessionFeedParser(HTTPServerCase):
+    handler = ConditionalHandler
+
+    def setUp(self):
+        super(test_SessionFeedParser, self).setUp()
+        self.parser = parsers.SessionFeedParser()
+
+    def test_parse(self):
+        feed = self.parser.parse(self.url + "example_feed.rss")
+        expected = feedparser.parse(get_data_filename("example_feed.rss"))
+        self.assertEqual(feed.status, http.OK)
+        self.assertEqual(feed.href, self.url + "example_feed.rss")
+        self.assertEqual(feed.channel.title, expected.channel.title)
+        self.assertListEqual([entry.guid for entry in feed.entries],
+                             [entry.guid for entry in expected.entries])
+
+    def test_not_modified(self):
+        feed = self.parser.parse(self.url + "example_feed.rss",
+                                 etag=ConditionalHandler.etag)
+        self.assertEqual(feed.status, http.NOT_MODIFIED)
+        self.assertListEqual(feed.entries, [])
+
+    def test_gzip(self):
+        feed = self.parser.parse(self.url + "gzip.rss")
+        self.assertEqual(feed.bozo, 0)
+        self.assertEqual(len(feed.entries), 40)
+
+    def test_timeout(self):
+        prev_timeout = socket.getdefaulttimeout()
+        with self.assertRaises(socket.timeout):
+            self.parser.parse(self.url + "slow.rss", timeout=0.2)
+        self.assertEqual(socket.getdefaulttimeout(), prev_timeout)
+
+    def test_redirect(self):
+        feed = self.parser.parse(self.url + "moved.rss")
+        self.assertEqual(feed.status, http.MOVED_PERMANENTLY)
+        self.assertEqual(feed.href, self.url + "example_feed.rss")
+        self.assertEqual(len(feed.entries), 40)
+
+    def test_session_is_shared(self):
+        self.assertIs(self.parser.get_session(),
+                      LxmlFeedParser().get_session())
+        self.assertIs(FeedImporter.parser.get_session(),
+                      self.parser.get_session())
+
+
+class test_FeedImporter_parse_feed_no_head(HTTPServerCase):
+    handler = NoHeadHandler
+
+    def test_falls_back_to_get(self):
+        del(self.handler.methods[:])
+        feed = FeedImporter().parse_feed(self.url + "example_feed.rss",
+                                         maxlen=1024)
+        self.assertEqual(len(feed.entries), 40)
+        self.assertListEqual(self.handler.methods, ["HEAD", "GET"])
+
+
+@unittest.skipIf(parsers.etree is None, "lxml not installed")
+class test_LxmlFeedParser_http(HTTPServerCase):
+
+    def setUp(self):
+        super(test_LxmlFeedParser_http, self).setUp()
+        self.parser = LxmlFeedParser()
+
+    def test_fetch(self):
+        feed = self.parser.parse(self.url + "example_feed.rss")
+        self.assertEqual(feed.status, 200)
+        self.assertEqual(feed.href, self.url + "example_feed.rss")
+        self.assertEqual(len(feed.entries), 40)
+
+    def test_fetch_not_found(self):
+        feed = self.parser.parse(self.url + "does_not_exist.rss")
+        self.assertEqual(feed.status, 404)
+        self.assertListEqual(feed.entries, [])
+
+    @unittest.skipIf(parsers.requests is None, "requests not installed")
+    def test_session_is_shared(self):
+        self.assertIs(self.parser.get_session(),
+                      LxmlFeedParser().get_session())
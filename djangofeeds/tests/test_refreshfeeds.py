@@ -0,0 +1,79 @@
+import sys
+import socket
+import threading
+import unittest2 as unittest
+from StringIO import StringIO
+
+from djangofeeds.importers import FeedImporter
+from djangofeeds.management.commands import refreshfeeds
+from djangofeeds.models import Feed
+from djangofeeds.tests.test_importers import get_data_filename
+
+
+class test_refresh_all(unittest.TestCase):
+
+    def setUp(self):
+        Feed.objects.all().delete()
+        for name in ("first", "broken", "last"):
+            Feed.objects.create(name=name, feed_url="%s.rss" % name, sort=0)
+
+    def refresh_all(self, importer, **kwargs):
+        closed = []
+        prev_importer, refreshfeeds.FeedImporter = \
+                refreshfeeds.FeedImporter, importer
+        prev_close, refreshfeeds.close_connection = \
+                refreshfeeds.close_connection, lambda: closed.append(1)
+        prev_stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            refreshfeeds.refresh_all(**kwargs)
+            self.connections_closed = len(closed)
+            return sys.stderr.getvalue()
+        finally:
+            refreshfeeds.FeedImporter = prev_importer
+            refreshfeeds.close_connection = prev_close
+            sys.stderr = prev_stderr
+
+    def test_error_does_not_stop_other_feeds(self):
+        refreshed, timeouts = [], []
+        lock = threading.Lock()
+
+        class _Verify(FeedImporter):
+
+            def update_feed(self, feed_obj, feed=None, force=False):
+                with lock:
+                    timeouts.append(socket.getdefaulttimeout())
+                if feed_obj.name == "broken":
+                    raise KeyError("broken")
+                with lock:
+                    refreshed.append(feed_obj.name)
+                return feed_obj
+
+        prev_timeout = socket.getdefaulttimeout()
+        output = self.refresh_all(_Verify, workers=2)
+        self.assertItemsEqual(refreshed, ["first", "last"])
+        self.assertIn("Error refreshing feed broken", output)
+        self.assertEqual(output.count("*** Total"), 2)
+        self.assertListEqual(timeouts, [_Verify().timeout] * 3)
+        self.assertEqual(socket.getdefaulttimeout(), prev_timeout)
+        self.assertEqual(self.connections_closed, 3)
+
+    def test_single_worker(self):
+        Feed.objects.all().delete()
+        feed_obj = FeedImporter(update_on_import=False).import_feed(
+                        get_data_filename("example_feed.rss"), local=True)
+        thread = threading.current_thread()
+        threads = []
+
+        class _Verify(FeedImporter):
+
+            def update_feed(self, feed_obj, feed=None, force=False):
+                threads.append(threading.current_thread())
+                return super(_Verify, self).update_feed(feed_obj, feed=feed,
+                                                        force=force)
+
+        output = self.refresh_all(_Verify, workers=1)
+        self.assertListEqual(threads, [thread])
+        self.assertEqual(self.connections_closed, 0)
+        self.assertIn("*** Total 20 posts", output)
+        self.assertEqual(Feed.objects.get(pk=feed_obj.pk).get_post_count(),
+                         20)
@@ -1,8 +1,10 @@
 import pytz
+import time
 import unittest2 as unittest
 from datetime import datetime, timedelta
 
-from djangofeeds.utils import naturaldate
+from djangofeeds.utils import naturaldate, truncate_field_data
+from djangofeeds.models import Feed
 from djangofeeds.feedutil import (entries_by_date,
                                   get_entry_guid,
                                   date_to_datetime)
@@ -120,6 +122,19 @@ class TestNaturalDate(unittest.TestCase):
 
         self.assertEqual(improper_list, entries_by_date(improper_list))
 
+    def test_entries_by_date_same_date_keeps_order(self):
+        now = datetime.now(pytz.utc)
+        entries = [{"title": "same %d" % i, "date_parsed": now}
+                        for i in range(4)]
+        self.assertEqual(list(entries), entries_by_date(entries))
+
+    def test_entries_by_date_keeps_time_tuples(self):
+        old, new = time.gmtime(1000000000), time.gmtime(1300000000)
+        entries = entries_by_date([{"date_parsed": old},
+                                   {"date_parsed": new}])
+        self.assertIs(entries[0]["updated_parsed"], new)
+        self.assertIs(entries[1]["updated_parsed"], old)
+
     def test_missing_guid(self):
         entries = [
             {"title": u"first",
@@ -150,3 +165,14 @@ class TestNaturalDate(unittest.TestCase):
         reversed_entries.reverse()
         self.assertNotEqual(entries, reversed_entries)
         self.assertEqual(entries, entries_by_date(reversed_entries))
+
+
+class TestTruncateFieldData(unittest.TestCase):
+
+    def test_truncates_by_max_length(self):
+        data = truncate_field_data(Feed, {"name": "x" * 300,
+                                          "last_error": "short",
+                                          "description": "y" * 300})
+        self.assertEqual(data["name"], "x" * 200)
+        self.assertEqual(data["last_error"], "short")
+        self.assertEqual(data["description"], "y" * 300)
@@ -6,6 +6,7 @@ from django.utils.timezone import utc
 from django.utils.translation import ungettext, ugettext as _
 
 _logger = None
+_fields_cache = {}
 
 JUST_NOW = _("just now")
 SECONDS_AGO = (_("%(seconds)d second ago"), _("%(seconds)d seconds ago"))
@@ -78,11 +79,23 @@ def truncate_by_field(field, value):
 
     """
     if isinstance(value, basestring) and \
-            hasattr(field, "max_length") and value > field.max_length:
+            getattr(field, "max_length", None) and \
+            len(value) > field.max_length:
                 return value[:field.max_length]
     return value
 
 
+def _fields_by_name(model):
+    """Get a mapping of field names to fields for a model, cached
+    per model as the fields never change at runtime."""
+    try:
+        return _fields_cache[model]
+    except KeyError:
+        fields = _fields_cache[model] = dict((field.name, field)
+                                    for field in model._meta.fields)
+        return fields
+
+
 def truncate_field_data(model, data):
     """Truncate all data fields for model by its ``max_length`` field
     attributes.
@@ -91,7 +104,7 @@ def truncate_field_data(model, data):
     :param data: The data to truncate.
 
     """
-    fields = dict((field.name, field) for field in model._meta.fields)
+    fields = _fields_by_name(model)
     return dict((name, truncate_by_field(fields[name], value))
                     for name, value in data.items())
 